@@ -0,0 +1,44 @@
+/// A simple in-memory cache whose entries expire [ttl] after they are written.
+///
+/// When [maxEntries] is set, the least recently used entry is evicted once the cache grows past it,
+/// so long-running processes do not accumulate entries for keys that are never read again.
+class TtlCache<K, V> {
+  final Duration ttl;
+  final int? maxEntries;
+  // Map literals are insertion ordered, so the first key is always the least recently used one.
+  final Map<K, _CacheEntry<V>> _entries = {};
+
+  TtlCache({required this.ttl, this.maxEntries}) : assert(maxEntries == null || maxEntries > 0);
+
+  /// Returns the value cached under [key], or `null` if there is none or it has expired.
+  V? get(K key) {
+    final entry = _entries.remove(key);
+    if (entry == null || DateTime.now().isAfter(entry.expiresAt)) return null;
+    _entries[key] = entry;
+    return entry.value;
+  }
+
+  /// Caches [value] under [key] for [ttl].
+  void set(K key, V value) {
+    _entries.remove(key);
+    _entries[key] = _CacheEntry(value, DateTime.now().add(ttl));
+    if (maxEntries != null && _entries.length > maxEntries!) _entries.remove(_entries.keys.first);
+  }
+
+  /// Removes the value cached under [key], if any.
+  void remove(K key) {
+    _entries.remove(key);
+  }
+
+  /// Removes all cached values.
+  void clear() {
+    _entries.clear();
+  }
+}
+
+class _CacheEntry<V> {
+  final V value;
+  final DateTime expiresAt;
+
+  _CacheEntry(this.value, this.expiresAt);
+}
@@ -0,0 +1,33 @@
+import 'dart:math';
+
+/// Calls [action] for every element of [items] with at most [concurrency] calls in flight at any given time.
+///
+/// Results are returned in the same order as [items].
+/// Once a call throws, no further calls are started; the first error is rethrown after the calls already in flight
+/// have completed, so a failed batch does not keep sending requests whose results would be discarded.
+Future<List<R>> mapConcurrently<T, R>(
+  Iterable<T> items,
+  Future<R> Function(T item) action, {
+  int concurrency = 8,
+}) async {
+  assert(concurrency > 0, 'concurrency must be greater than 0');
+  final inputs = items.toList();
+  final results = List<R?>.filled(inputs.length, null);
+  var next = 0;
+  var failed = false;
+
+  Future<void> worker() async {
+    while (!failed && next < inputs.length) {
+      final index = next++;
+      try {
+        results[index] = await action(inputs[index]);
+      } catch (_) {
+        failed = true;
+        rethrow;
+      }
+    }
+  }
+
+  await Future.wait(List.generate(min(concurrency, inputs.length), (_) => worker()));
+  return List<R>.from(results);
+}
@@ -14,3 +14,9 @@ const kTubeXtendGoogleApisScopes = [
   // 'https://gdata.youtube.com/captions',
   // 'https://gdata.youtube.com/feed',
 ];
+
+/// Default number of YouTube Data API quota units available to a project per day.
+///
+/// Methods cost different numbers of units (`search.list` costs 100, `playlistItems.list` costs 1), so a
+/// `RateLimiter` given this budget must be charged each request's unit cost, not one token per request.
+const kYouTubeDailyQuotaUnits = 10000;
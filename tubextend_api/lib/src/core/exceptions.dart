@@ -0,0 +1,11 @@
+/// Thrown when the daily YouTube Data API quota of the project has been used up.
+///
+/// Retrying is pointless until the quota resets at midnight Pacific Time.
+class QuotaExceededException implements Exception {
+  final String? message;
+
+  const QuotaExceededException([this.message]);
+
+  @override
+  String toString() => message == null ? 'QuotaExceededException' : 'QuotaExceededException: $message';
+}
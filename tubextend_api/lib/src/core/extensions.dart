@@ -8,3 +8,18 @@ extension ExtendedList on List<String?> {
   /// Returns a list of unique strings including null if present (for null free uniques use [uniquesNullFree]).
   List<String?> get uniques => toSet().toList();
 }
+
+extension ChunkedIterable<T> on Iterable<T> {
+  /// Lazily splits this iterable into lists of at most [size] elements, building one chunk at a time.
+  Iterable<List<T>> chunked(int size) sync* {
+    assert(size > 0, 'size must be greater than 0');
+    final iterator = this.iterator;
+    while (iterator.moveNext()) {
+      final chunk = <T>[iterator.current];
+      while (chunk.length < size && iterator.moveNext()) {
+        chunk.add(iterator.current);
+      }
+      yield chunk;
+    }
+  }
+}
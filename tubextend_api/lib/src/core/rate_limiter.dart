@@ -0,0 +1,58 @@
+import 'dart:math';
+
+/// A token bucket used to pace requests against an API quota.
+///
+/// Up to [capacity] requests can go out in a burst; after that [acquire] waits until the bucket has refilled
+/// at a rate of [refillPerSecond] tokens per second, instead of stalling until the quota resets.
+class RateLimiter {
+  final int capacity;
+  final double refillPerSecond;
+
+  double _tokens;
+  // Stopwatch is monotonic, unlike DateTime.now(), so clock adjustments cannot skew the refill.
+  final Stopwatch _clock = Stopwatch()..start();
+  int _lastRefillMicros = 0;
+  Future<void> _pending = Future.value();
+
+  RateLimiter({
+    required this.capacity,
+    required this.refillPerSecond,
+  })  : assert(capacity > 0),
+        assert(refillPerSecond > 0),
+        _tokens = capacity.toDouble();
+
+  /// A limiter that spreads a daily [quota] evenly over the day, allowing bursts of up to [burst] tokens.
+  ///
+  /// [burst] defaults to the whole [quota], matching a fixed daily budget while still pacing refills.
+  /// YouTube bills quota in units that differ per method, so when [quota] is a unit budget such as
+  /// `kYouTubeDailyQuotaUnits`, every request must [acquire] its unit cost rather than a single token.
+  factory RateLimiter.perDay(int quota, {int? burst}) => RateLimiter(
+        capacity: burst ?? quota,
+        refillPerSecond: quota / Duration.secondsPerDay,
+      );
+
+  /// Completes once a request costing [cost] tokens is allowed to go out.
+  ///
+  /// Callers are served in the order they call [acquire].
+  Future<void> acquire([int cost = 1]) {
+    assert(cost > 0 && cost <= capacity, 'cost must be between 1 and capacity');
+    return _pending = _pending.then((_) => _take(cost));
+  }
+
+  Future<void> _take(int cost) async {
+    _refill();
+    if (_tokens < cost) {
+      final wait = (cost - _tokens) / refillPerSecond * Duration.microsecondsPerSecond;
+      await Future.delayed(Duration(microseconds: wait.ceil()));
+      _refill();
+    }
+    _tokens -= cost;
+  }
+
+  void _refill() {
+    final now = _clock.elapsedMicroseconds;
+    final elapsed = (now - _lastRefillMicros) / Duration.microsecondsPerSecond;
+    _tokens = min(capacity.toDouble(), _tokens + elapsed * refillPerSecond);
+    _lastRefillMicros = now;
+  }
+}
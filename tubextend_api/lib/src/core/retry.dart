@@ -0,0 +1,47 @@
+import 'dart:async';
+import 'dart:io';
+import 'dart:math';
+
+import 'package:googleapis/youtube/v3.dart';
+import 'package:http/http.dart';
+
+import 'logger.dart';
+
+const _rateLimitReasons = {'rateLimitExceeded', 'userRateLimitExceeded'};
+final _random = Random();
+
+/// Whether [error] is a transient failure worth retrying.
+///
+/// Network errors, timeouts, server errors (5xx) and short-term rate limiting are transient.
+/// Everything else, including an exhausted daily quota, is not.
+bool isTransientError(Object error) {
+  if (error is DetailedApiRequestError) {
+    final status = error.status ?? 0;
+    return status >= 500 || status == 429 || error.errors.any((detail) => _rateLimitReasons.contains(detail.reason));
+  }
+  return error is SocketException || error is HttpException || error is ClientException || error is TimeoutException;
+}
+
+/// Calls [action] until it succeeds, retrying the errors accepted by [retryIf] for up to [maxAttempts] attempts in total.
+///
+/// Retries back off exponentially from [initialDelay] up to [maxDelay], with random jitter so that concurrent
+/// callers do not all retry at the same moment.
+Future<T> withRetry<T>(
+  Future<T> Function() action, {
+  int maxAttempts = 3,
+  Duration initialDelay = const Duration(milliseconds: 500),
+  Duration maxDelay = const Duration(seconds: 30),
+  bool Function(Object error) retryIf = isTransientError,
+}) async {
+  for (var attempt = 1;; attempt++) {
+    try {
+      return await action();
+    } catch (e) {
+      if (attempt >= maxAttempts || !retryIf(e)) rethrow;
+      final backoff = min(initialDelay.inMilliseconds * pow(2, attempt - 1), maxDelay.inMilliseconds).toInt();
+      final delay = Duration(milliseconds: backoff ~/ 2 + _random.nextInt(backoff ~/ 2 + 1));
+      logger.w('Attempt $attempt failed, retrying in ${delay.inMilliseconds}ms: $e');
+      await Future.delayed(delay);
+    }
+  }
+}
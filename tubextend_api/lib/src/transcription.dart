@@ -1,11 +1,19 @@
 import 'package:youtube_explode_dart/youtube_explode_dart.dart';
 
+import 'core/cache.dart';
 import 'core/logger.dart';
 
+final _transcriptCache = TtlCache<String, String>(ttl: const Duration(hours: 6), maxEntries: 100);
+// Videos found without English captions, so repeated requests fail fast instead of downloading the manifest again.
+final _missingCaptionsCache = TtlCache<String, bool>(ttl: const Duration(hours: 1), maxEntries: 500);
+
 /// Retrieves the transcript of a YouTube video with the given [videoId].
 ///
 /// The transcript is retrieved using the [YoutubeExplode] package.
+/// An optional [youtubeExplode] instance can be shared across calls. It is not closed here; that is up to the caller.
+/// Transcripts are cached in memory for a few hours, so asking for the same video again skips the download.
 /// If no captions are found for the video, an [Exception] is thrown.
+/// That result is remembered for an hour, so captions YouTube generates in the meantime are only picked up after it.
 ///
 /// Example usage:
 /// ```dart
@@ -20,19 +28,33 @@ import 'core/logger.dart';
 /// Returns a [Future] that completes with the transcript as a [String] if successful, or `null` if an error occurs.
 ///
 /// Throws an [Exception] if no captions are found for the video.
-Future<String?> getVideoTranscript(String videoId) async {
-  final yt = YoutubeExplode();
+Future<String?> getVideoTranscript(String videoId, {YoutubeExplode? youtubeExplode}) async {
+  final cacheKey = VideoId.parseVideoId(videoId) ?? videoId;
+  final cached = _transcriptCache.get(cacheKey);
+  if (cached != null) return cached;
+  if (_missingCaptionsCache.get(cacheKey) == true) {
+    final error = Exception('No captions found');
+    logger.e(error);
+    throw error;
+  }
+  final yt = youtubeExplode ?? YoutubeExplode();
   try {
     final manifest = await yt.videos.closedCaptions.getManifest(VideoId(videoId));
     final trackInfo = manifest.getByLanguage('en', autoGenerated: true);
 
-    if (trackInfo.isNotEmpty != true) throw Exception('No captions found');
+    if (trackInfo.isNotEmpty != true) {
+      _missingCaptionsCache.set(cacheKey, true);
+      throw Exception('No captions found');
+    }
     final track = await yt.videos.closedCaptions.get(trackInfo.first);
     final data = track.captions.map((element) => element.text).join('\n');
+    _transcriptCache.set(cacheKey, data);
     logger.i('Transcript fetched successfully');
     return data;
   } catch (e) {
     logger.e(e);
     rethrow;
+  } finally {
+    if (youtubeExplode == null) yt.close();
   }
 }
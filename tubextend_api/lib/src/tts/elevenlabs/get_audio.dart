@@ -5,6 +5,8 @@ import 'package:http/http.dart';
 import '../../core/endpoints.dart';
 import '../../core/logger.dart';
 
+final _whitespace = RegExp(r"\s+");
+
 /// Creates an audio file from the given [text] using the ElevenLabs API.
 ///
 /// The [apiKey] is required to access the API.
@@ -13,8 +15,10 @@ import '../../core/logger.dart';
 /// The resulting file is stored in the [tempDirectory] directory.
 /// The [stability] parameter ranges from 0.0 to 1.0 and determines the stability of the generated audio.
 /// The [similarityBoost] parameter ranges from 0.0 to 1.0 and determines the similarity of the generated audio to the input text.
+/// The [client] parameter is optional and lets several calls share one connection pool. The caller must close it.
 ///
 /// Returns a [File] object containing the generated audio.
+/// Throws an [Exception] with the API response if the audio could not be generated, without writing any file.
 Future<File> generateSpeechFrom({
   required String apiKey,
   required String text,
@@ -23,6 +27,7 @@ Future<File> generateSpeechFrom({
   required Directory tempDirectory,
   double stability = 0.0,
   double similarityBoost = 0.0,
+  Client? client,
 }) async {
   // Converts text to speech
   var endpoint = 'text-to-speech/$voiceId';
@@ -39,32 +44,32 @@ Future<File> generateSpeechFrom({
     'similarity_boost': similarityBoost,
   };
 
+  final httpClient = client ?? Client();
   try {
     final dir = tempDirectory;
-    final file = File('${dir.path}/${fileName?.replaceAll(RegExp(r"\s+"), "")}.mp3');
-
-    if (await file.exists()) return file;
+    final cacheName = fileName?.replaceAll(_whitespace, "");
+    if (cacheName != null) {
+      final file = File('${dir.path}/$cacheName.mp3');
+      if (await file.exists()) return file;
+    }
 
-    final client = Client();
-
-    var response = await client.post(
+    var response = await httpClient.post(
       Uri.parse("${ElevenLabsEndpoints.baseUrl}/$endpoint"),
       headers: headers,
       body: json.encode(jsonData),
     );
-    String id = DateTime.now().millisecondsSinceEpoch.toString();
-
-    final newFile = fileName?.replaceAll(RegExp(r"\s+"), "") != null
-        ? File('${dir.path}/${fileName?.replaceAll(RegExp(r"\s+"), "")}.mp3')
-        : File('${dir.path}/$id.mp3');
+    if (response.statusCode != 200) throw Exception(response.body);
+    String id = cacheName ?? DateTime.now().millisecondsSinceEpoch.toString();
+    final newFile = File('${dir.path}/$id.mp3');
 
     final bytes = response.bodyBytes;
     await newFile.writeAsBytes(bytes);
-    client.close();
-    logger.i('Generated speech from text: $text \nin file: ${newFile.path}');
+    logger.i('Generated speech from ${text.length} characters of text in file: ${newFile.path}');
     return newFile;
   } catch (e) {
     logger.e(e);
     rethrow;
+  } finally {
+    if (client == null) httpClient.close();
   }
 }
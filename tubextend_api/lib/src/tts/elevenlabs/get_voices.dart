@@ -8,10 +8,12 @@ import '../../core/logger.dart';
 /// Fetches a list of available voices from the ElevenLabs TTS API using the provided API key.
 /// Returns a Future that completes with a List of Voice objects.
 /// Throws an error if the API request fails
-Future<List<Voice>> listVoices(String apiKey) async {
+///
+/// Pass a [client] to reuse its connections; the caller owns it and must close it.
+Future<List<Voice>> listVoices(String apiKey, {http.Client? client}) async {
+  final httpClient = client ?? http.Client();
   try {
-    final client = http.Client();
-    final response = await client.get(
+    final response = await httpClient.get(
       Uri.parse(ElevenLabsEndpoints.voicesUrl),
       headers: {
         'xi-api-key': apiKey,
@@ -23,11 +25,12 @@ Future<List<Voice>> listVoices(String apiKey) async {
     if (json["voices"] == null) throw Exception('voices is null…\n${response.body}');
     final list = json["voices"] as List;
     List<Voice> voices = list.map((e) => Voice.fromJson(e)).toList();
-    client.close();
     logger.i('Voices fetched successfully');
     return voices;
   } catch (e) {
     logger.e(e);
     rethrow;
+  } finally {
+    if (client == null) httpClient.close();
   }
 }
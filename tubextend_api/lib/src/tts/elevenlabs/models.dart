@@ -6,7 +6,7 @@ class VoicesModel {
   List<Voice> voices;
 
   factory VoicesModel.fromJson(Map<String, dynamic> json) => VoicesModel(
-        voices: List<Voice>.from(json["voices"].map((x) => Voice.fromJson(x))),
+        voices: (json["voices"] as List<dynamic>).map((x) => Voice.fromJson(x)).toList(),
       );
 }
 
@@ -46,11 +46,11 @@ class Voice {
             (json['high_quality_base_model_ids'] is List ? json['high_quality_base_model_ids'] as List<dynamic> : [])
                 .map<String>((e) => '$e')
                 .toList(),
-        samples: List<Sample>.from((json["samples"] ?? []).map((x) => Sample.fromJson(x))),
+        samples: ((json["samples"] ?? []) as List<dynamic>).map((x) => Sample.fromJson(x)).toList(),
         category: json["category"],
         labels: json["labels"],
         previewUrl: json["preview_url"],
-        availableForTiers: List<dynamic>.from((json["available_for_tiers"] ?? []).map((x) => x)),
+        availableForTiers: json["available_for_tiers"] ?? [],
         settings: Settings.fromJson(json["settings"]),
       );
 }
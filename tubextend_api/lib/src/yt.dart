@@ -2,38 +2,88 @@ import 'package:googleapis/youtube/v3.dart';
 import 'package:tubextend_api/src/core/logger.dart';
 import 'package:tubextend_api/src/core/models.dart';
 import 'package:googleapis_auth/auth_io.dart';
+import './core/cache.dart';
+import './core/concurrency.dart';
+import './core/exceptions.dart';
 import './core/extensions.dart';
+import './core/rate_limiter.dart';
+import './core/retry.dart';
 
-Future<List<String>> getYTCategoriesAsChannelIds(AuthClient client, {String? hl, String regionCode = 'US'}) async {
-  final ytApi = YouTubeApi(client);
+/// Sends a YouTube API [request], retrying transient errors and reporting an exhausted quota as a
+/// [QuotaExceededException] so callers can catch it by type.
+/// If a [rateLimiter] is given, every attempt, including retries, waits for it to grant [cost] tokens before going
+/// out, so a limiter holding a daily unit budget is charged the quota cost of the method.
+Future<T> _request<T>(Future<T> Function() request, {RateLimiter? rateLimiter, int cost = 1}) async {
   try {
-    final categories = await ytApi.videoCategories.list(
-      ['snippet'],
-      hl: hl,
-      regionCode: regionCode,
-    );
-    if (categories.items?.isNotEmpty != true) throw Exception('No categories found');
-    return categories.items!.map<String?>((category) => category.snippet?.channelId).toList().uniquesNullFree;
+    return await withRetry(() async {
+      await rateLimiter?.acquire(cost);
+      return request();
+    });
+  } on DetailedApiRequestError catch (e) {
+    if (e.errors.any((detail) => detail.reason == 'quotaExceeded')) throw QuotaExceededException(e.message);
+    rethrow;
+  }
+}
+
+/// Returns the unique channel Ids of the video categories available in [regionCode].
+///
+/// Built on [getYTCategories], so it shares its request and its in-memory cache.
+Future<List<String>> getYTCategoriesAsChannelIds(
+  AuthClient client, {
+  String? hl,
+  String regionCode = 'US',
+  RateLimiter? rateLimiter,
+}) async {
+  final categories = await getYTCategories(client, hl: hl, regionCode: regionCode, rateLimiter: rateLimiter);
+  return categories.map<String?>((category) => category.snippet?.channelId).toList().uniquesNullFree;
+}
+
+// Holds the request future rather than its result, so concurrent lookups for the same key share a single request.
+final _categoriesCache = TtlCache<String, Future<List<VideoCategory>>>(ttl: const Duration(hours: 1), maxEntries: 32);
+
+/// Returns the video categories available in [regionCode], localized to [hl].
+///
+/// Categories rarely change, so results are cached in memory for an hour per region and language.
+/// Concurrent calls for the same region and language share a single request; a failed request is not cached.
+/// The returned list is shared between callers and cannot be modified.
+/// If a [rateLimiter] is given, the request waits for it before going out; cached results do not.
+Future<List<VideoCategory>> getYTCategories(
+  AuthClient client, {
+  String? hl,
+  String regionCode = 'US',
+  RateLimiter? rateLimiter,
+}) async {
+  final cacheKey = '$regionCode:${hl ?? ''}';
+  final cached = _categoriesCache.get(cacheKey);
+  if (cached != null) return cached;
+  final request = _fetchYTCategories(client, hl: hl, regionCode: regionCode, rateLimiter: rateLimiter);
+  _categoriesCache.set(cacheKey, request);
+  try {
+    return await request;
   } catch (e) {
+    _categoriesCache.remove(cacheKey);
     logger.e(e);
     rethrow;
   }
 }
 
-Future<List<VideoCategory>> getYTCategories(AuthClient client, {String? hl, String regionCode = 'US'}) async {
+Future<List<VideoCategory>> _fetchYTCategories(
+  AuthClient client, {
+  String? hl,
+  required String regionCode,
+  RateLimiter? rateLimiter,
+}) async {
   final ytApi = YouTubeApi(client);
-  try {
-    final categories = await ytApi.videoCategories.list(
+  final categories = await _request(
+    () => ytApi.videoCategories.list(
       ['snippet'],
       hl: hl,
       regionCode: regionCode,
-    );
-    if (categories.items?.isNotEmpty != true) throw Exception('No categories found');
-    return categories.items!;
-  } catch (e) {
-    logger.e(e);
-    rethrow;
-  }
+    ),
+    rateLimiter: rateLimiter,
+  );
+  if (categories.items?.isNotEmpty != true) throw Exception('No categories found');
+  return List<VideoCategory>.unmodifiable(categories.items!);
 }
 
 Future<List<Video>> getYTpopularVideosFromCategory(
@@ -41,16 +91,20 @@ Future<List<Video>> getYTpopularVideosFromCategory(
   String categoryId, {
   String? hl,
   String regionCode = 'US',
+  RateLimiter? rateLimiter,
 }) async {
   final ytApi = YouTubeApi(client);
   try {
-    final response = await ytApi.videos.list(
-      ['snippet'],
-      chart: 'mostPopular',
-      videoCategoryId: categoryId,
-      hl: hl,
-      regionCode: regionCode,
-      maxResults: 50,
+    final response = await _request(
+      () => ytApi.videos.list(
+        ['snippet'],
+        chart: 'mostPopular',
+        videoCategoryId: categoryId,
+        hl: hl,
+        regionCode: regionCode,
+        maxResults: 50,
+      ),
+      rateLimiter: rateLimiter,
     );
 
     if (response.items?.isNotEmpty != true) throw Exception('No videos found');
@@ -61,13 +115,18 @@ Future<List<Video>> getYTpopularVideosFromCategory(
   }
 }
 
-Future<List<Video>> searchForVideosByString(AuthClient client, String query) async {
+Future<List<Video>> searchForVideosByString(AuthClient client, String query, {RateLimiter? rateLimiter}) async {
   final ytApi = YouTubeApi(client);
   try {
-    final response = await ytApi.search.list(
-      ['snippet'],
-      q: query,
-      type: ['video'],
+    final response = await _request(
+      () => ytApi.search.list(
+        ['snippet'],
+        q: query,
+        type: ['video'],
+      ),
+      rateLimiter: rateLimiter,
+      // search.list costs 100 quota units; the other list methods used here cost 1.
+      cost: 100,
     );
     if (response.items?.isNotEmpty != true) throw Exception('No videos found');
     return response.items!
@@ -84,26 +143,28 @@ Future<List<Video>> searchForVideosByString(AuthClient client, String query) asy
                 ),
                 id: e.id!.videoId!,
               ))
-        .where((e) => e != null)
-        .toList()
-        .cast<Video>();
+        .whereType<Video>()
+        .toList();
   } catch (e) {
     logger.e(e);
     rethrow;
   }
 }
 
-Future<List<Subscription>> getUserSubscriptions(AuthClient client) async {
+Future<List<Subscription>> getUserSubscriptions(AuthClient client, {RateLimiter? rateLimiter}) async {
   final ytApi = YouTubeApi(client);
   try {
     final List<Subscription> subscriptions = [];
     String? nextPageToken = '_';
     while (nextPageToken != null) {
-      final response = await ytApi.subscriptions.list(
-        ['snippet', 'contentDetails'],
-        mine: true,
-        maxResults: 50,
-        pageToken: nextPageToken == '_' ? null : nextPageToken,
+      final response = await _request(
+        () => ytApi.subscriptions.list(
+          ['snippet', 'contentDetails'],
+          mine: true,
+          maxResults: 50,
+          pageToken: nextPageToken == '_' ? null : nextPageToken,
+        ),
+        rateLimiter: rateLimiter,
       );
       if (response.items?.isNotEmpty != true) throw Exception('No subscriptions found');
       subscriptions.addAll(response.items!);
@@ -116,17 +177,20 @@ Future<List<Subscription>> getUserSubscriptions(AuthClient client) async {
   }
 }
 
-Future<List<Playlist>> getUserPlaylists(AuthClient client) async {
+Future<List<Playlist>> getUserPlaylists(AuthClient client, {RateLimiter? rateLimiter}) async {
   final ytApi = YouTubeApi(client);
   try {
     final List<Playlist> playlists = [];
     String? nextPageToken = '_';
     while (nextPageToken != null) {
-      final response = await ytApi.playlists.list(
-        ['snippet', 'contentDetails'],
-        maxResults: 50,
-        mine: true,
-        pageToken: nextPageToken == '_' ? null : nextPageToken,
+      final response = await _request(
+        () => ytApi.playlists.list(
+          ['snippet', 'contentDetails'],
+          maxResults: 50,
+          mine: true,
+          pageToken: nextPageToken == '_' ? null : nextPageToken,
+        ),
+        rateLimiter: rateLimiter,
       );
       if (response.items?.isNotEmpty != true) throw Exception('No playlists found');
       playlists.addAll(response.items!);
@@ -139,14 +203,21 @@ Future<List<Playlist>> getUserPlaylists(AuthClient client) async {
   }
 }
 
-Future<String> getUploadsPlaylistIdFromSubscription(AuthClient client, Subscription subscription) async {
+Future<String> getUploadsPlaylistIdFromSubscription(
+  AuthClient client,
+  Subscription subscription, {
+  RateLimiter? rateLimiter,
+}) async {
   final subscriptionChannelId = subscription.snippet?.resourceId?.channelId;
   if (subscriptionChannelId == null) throw Exception('No channel id found');
   try {
     final ytApi = YouTubeApi(client);
-    final response = await ytApi.channels.list(
-      ['contentDetails'],
-      id: [subscriptionChannelId],
+    final response = await _request(
+      () => ytApi.channels.list(
+        ['contentDetails'],
+        id: [subscriptionChannelId],
+      ),
+      rateLimiter: rateLimiter,
     );
     final uploadsPlaylistId = response.items?.first.contentDetails?.relatedPlaylists?.uploads;
     if (uploadsPlaylistId == null) throw Exception('No uploads playlist found');
@@ -157,67 +228,218 @@ Future<String> getUploadsPlaylistIdFromSubscription(AuthClient client, Subscript
   }
 }
 
-Future<List<Video>> getAllVideosOfPlaylists(AuthClient client, String playlistId) async {
+/// Returns the uploads playlist Id of each of the given [subscriptions], keyed by channel Id.
+///
+/// Channels are looked up in batches of 50 (the most `channels.list` accepts per request) instead of one request
+/// per subscription, and the batches are requested concurrently.
+/// Subscriptions whose channel has no uploads playlist are left out of the result.
+/// If a [rateLimiter] is given, every request waits for it before going out, including retries of failed ones.
+Future<Map<String, String>> getUploadsPlaylistIdsFromSubscriptions(
+  AuthClient client,
+  List<Subscription> subscriptions, {
+  RateLimiter? rateLimiter,
+}) async {
+  final channelIds = subscriptions.map<String?>((s) => s.snippet?.resourceId?.channelId).toList().uniquesNullFree;
+  final ytApi = YouTubeApi(client);
+  try {
+    final responses = await mapConcurrently(
+      channelIds.chunked(50),
+      (List<String> batch) => _request(
+        () => ytApi.channels.list(
+          ['contentDetails'],
+          id: batch,
+          maxResults: 50,
+        ),
+        rateLimiter: rateLimiter,
+      ),
+    );
+    final Map<String, String> uploadsPlaylistIds = {};
+    for (final channel in responses.expand((response) => response.items ?? <Channel>[])) {
+      final uploadsPlaylistId = channel.contentDetails?.relatedPlaylists?.uploads;
+      if (channel.id != null && uploadsPlaylistId != null) uploadsPlaylistIds[channel.id!] = uploadsPlaylistId;
+    }
+    return uploadsPlaylistIds;
+  } catch (e) {
+    logger.e(e);
+    rethrow;
+  }
+}
+
+/// Returns every video of the playlist with the given [playlistId], following all result pages.
+///
+/// A video that appears more than once in the playlist is only returned once.
+/// If [publishedAfter] is given, only items added to the playlist after it are returned, and paging stops at the first
+/// older item instead of downloading the whole playlist. This relies on the playlist listing its newest items first,
+/// as channel uploads playlists do.
+/// If a [rateLimiter] is given, every page request waits for it before going out.
+Future<List<Video>> getAllVideosOfPlaylists(
+  AuthClient client,
+  String playlistId, {
+  DateTime? publishedAfter,
+  RateLimiter? rateLimiter,
+}) async {
   if (playlistId.isEmpty) throw Exception('Playlist id cannot be empty');
   final ytApi = YouTubeApi(client);
   try {
     final List<PlaylistItem> playlistItems = [];
     String? nextPageToken = '_';
     while (nextPageToken != null) {
-      final response = await ytApi.playlistItems.list(
-        playlistId: playlistId,
-        ['snippet'],
-        maxResults: 50,
-        pageToken: nextPageToken == '_' ? null : nextPageToken,
+      final response = await _request(
+        () => ytApi.playlistItems.list(
+          playlistId: playlistId,
+          ['snippet'],
+          maxResults: 50,
+          pageToken: nextPageToken == '_' ? null : nextPageToken,
+        ),
+        rateLimiter: rateLimiter,
       );
       if (response.items?.isNotEmpty != true) throw Exception('No playlists found');
-      playlistItems.addAll(response.items!);
-      nextPageToken = response.nextPageToken;
+      final items = publishedAfter == null
+          ? response.items!
+          : response.items!.takeWhile((item) => item.snippet?.publishedAt?.isAfter(publishedAfter) == true).toList();
+      playlistItems.addAll(items);
+      nextPageToken = items.length < response.items!.length ? null : response.nextPageToken;
+    }
+    return playlistItems.map((e) => e.video).whereType<Video>().uniqueById;
+  } catch (e) {
+    logger.e(e);
+    rethrow;
+  }
+}
+
+/// Emits the videos of the playlist with the given [playlistId] one result page at a time.
+///
+/// The request for the next page goes out before the current page is emitted, so listeners can process one page
+/// while the next one is still loading instead of waiting for the whole playlist.
+/// If a [rateLimiter] is given, every page request waits for it before going out.
+Stream<List<Video>> streamVideosOfPlaylist(AuthClient client, String playlistId, {RateLimiter? rateLimiter}) async* {
+  if (playlistId.isEmpty) throw Exception('Playlist id cannot be empty');
+  final ytApi = YouTubeApi(client);
+  Future<PlaylistItemListResponse> fetchPage(String? pageToken) => _request(
+        () => ytApi.playlistItems.list(
+          ['snippet'],
+          playlistId: playlistId,
+          maxResults: 50,
+          pageToken: pageToken,
+        ),
+        rateLimiter: rateLimiter,
+      );
+
+  Future<PlaylistItemListResponse>? nextPage = fetchPage(null);
+  try {
+    while (nextPage != null) {
+      final response = await nextPage;
+      final nextPageToken = response.nextPageToken;
+      // Nothing awaits the prefetched page while the generator is paused at yield or the listener cancels, so mark
+      // its error as handled up front; awaiting it later still receives the error.
+      nextPage = nextPageToken == null ? null : (fetchPage(nextPageToken)..ignore());
+      yield (response.items ?? <PlaylistItem>[]).map((e) => e.video).whereType<Video>().toList();
     }
-    return playlistItems.map<Video?>((e) => e.video).where((e) => e != null).toList().cast<Video>();
   } catch (e) {
     logger.e(e);
     rethrow;
   }
 }
 
-Future<List<Video>> getnVideosFromPlaylist(AuthClient client, String playlistId, {int maxResults = 50}) async {
+/// Returns up to [maxResults] of the most recent videos of the playlist with the given [playlistId].
+///
+/// If [publishedAfter] is given, items added to the playlist before it are dropped before any [Video] is built.
+/// Only the first page of up to [maxResults] items is filtered, in whatever order the playlist lists them.
+/// If a [rateLimiter] is given, the request and any retries of it wait for it before going out.
+Future<List<Video>> getnVideosFromPlaylist(
+  AuthClient client,
+  String playlistId, {
+  int maxResults = 50,
+  DateTime? publishedAfter,
+  RateLimiter? rateLimiter,
+}) async {
   final ytApi = YouTubeApi(client);
   try {
-    final playlistItems = await ytApi.playlistItems.list(
-      ['snippet', 'contentDetails'],
-      playlistId: playlistId,
-      maxResults: maxResults,
+    final playlistItems = await _request(
+      () => ytApi.playlistItems.list(
+        ['snippet', 'contentDetails'],
+        playlistId: playlistId,
+        maxResults: maxResults,
+      ),
+      rateLimiter: rateLimiter,
     );
     if (playlistItems.items?.isNotEmpty != true) throw Exception('No videos found');
-    return playlistItems.items!.map((e) => e.video).where((e) => e != null).toList().cast<Video>();
+    final items = publishedAfter == null
+        ? playlistItems.items!
+        : playlistItems.items!.where((item) => item.snippet?.publishedAt?.isAfter(publishedAfter) == true);
+    return items.map((e) => e.video).whereType<Video>().toList();
   } catch (e) {
     logger.e(e);
     rethrow;
   }
 }
 
+/// Returns up to [maxResults] videos from each of the given [playlistIds], keyed by playlist Id.
+///
+/// The playlists are independent of each other, so their requests run concurrently, with at most [concurrency]
+/// of them in flight at a time to stay within the YouTube API quota.
+/// If a [rateLimiter] is given, every request waits for it before going out, including retries of failed ones.
+/// If [publishedAfter] is given, videos added to a playlist before it are dropped from that playlist's first
+/// [maxResults] items.
+/// A playlist that fails to load is logged and left out of the result instead of failing the whole batch, except that
+/// an exhausted quota stops the batch and is rethrown as a [QuotaExceededException].
+Future<Map<String, List<Video>>> getnVideosFromPlaylists(
+  AuthClient client,
+  List<String> playlistIds, {
+  int maxResults = 50,
+  int concurrency = 8,
+  RateLimiter? rateLimiter,
+  DateTime? publishedAfter,
+}) async {
+  final results = await mapConcurrently(
+    playlistIds,
+    (String playlistId) async {
+      try {
+        final videos = await getnVideosFromPlaylist(
+          client,
+          playlistId,
+          maxResults: maxResults,
+          publishedAfter: publishedAfter,
+          rateLimiter: rateLimiter,
+        );
+        return MapEntry(playlistId, videos);
+      } on QuotaExceededException {
+        // Every remaining request would fail the same way, so stop the whole batch.
+        rethrow;
+      } catch (_) {
+        return null;
+      }
+    },
+    concurrency: concurrency,
+  );
+  return Map.fromEntries(results.whereType<MapEntry<String, List<Video>>>());
+}
+
 Future<PaginatedResponse<List<Video>>> getPaginatedVideosFromPlaylist(
   AuthClient client,
   String playlistId, {
   int? maxResults = 50,
   String? pageToken,
+  RateLimiter? rateLimiter,
 }) async {
   final ytApi = YouTubeApi(client);
   try {
-    final response = await ytApi.playlistItems.list(
-      ['snippet', 'contentDetails'],
-      playlistId: playlistId,
-      maxResults: maxResults,
-      pageToken: pageToken,
+    final response = await _request(
+      () => ytApi.playlistItems.list(
+        ['snippet', 'contentDetails'],
+        playlistId: playlistId,
+        maxResults: maxResults,
+        pageToken: pageToken,
+      ),
+      rateLimiter: rateLimiter,
     );
-    logger.i(
+    logger.d(
         'nextPageToken: ${response.nextPageToken}\nkind: ${response.kind}\npageInfo:\n\ttotal: ${response.pageInfo?.totalResults}\n\tper page: ${response.pageInfo?.resultsPerPage}');
     if (response.items?.isNotEmpty != true) throw Exception('No videos found');
     return PaginatedResponse(
       nextPageToken: response.nextPageToken,
       prefiousPageToken: response.prevPageToken,
-      data: response.items!.map((e) => e.video).where((e) => e != null).toList().cast<Video>(),
+      data: response.items!.map((e) => e.video).whereType<Video>().toList(),
     );
   } catch (e) {
     logger.e(e);
@@ -226,17 +448,29 @@ Future<PaginatedResponse<List<Video>>> getPaginatedVideosFromPlaylist(
 }
 
 extension PlaylistItemExtension on PlaylistItem {
-  Video? get video => snippet?.resourceId?.videoId == null
-      ? null
-      : Video(
-          snippet: VideoSnippet(
-            title: snippet!.title,
-            description: snippet!.description,
-            thumbnails: snippet!.thumbnails,
-            publishedAt: snippet!.publishedAt,
-            channelId: snippet!.channelId,
-            channelTitle: snippet!.channelTitle,
-          ),
-          id: snippet!.resourceId!.videoId!,
-        );
+  /// The [Video] this item points to, or `null` if the item has no video Id.
+  Video? get video {
+    final itemSnippet = snippet;
+    final videoId = itemSnippet?.resourceId?.videoId;
+    if (itemSnippet == null || videoId == null) return null;
+    return Video(
+      snippet: VideoSnippet(
+        title: itemSnippet.title,
+        description: itemSnippet.description,
+        thumbnails: itemSnippet.thumbnails,
+        publishedAt: itemSnippet.publishedAt,
+        channelId: itemSnippet.channelId,
+        channelTitle: itemSnippet.channelTitle,
+      ),
+      id: videoId,
+    );
+  }
+}
+
+extension VideoIterableExtension on Iterable<Video> {
+  /// Returns a list with only the first occurrence of each video Id, keeping the original order.
+  List<Video> get uniqueById {
+    final seenIds = <String>{};
+    return where((video) => video.id == null || seenIds.add(video.id!)).toList();
+  }
 }
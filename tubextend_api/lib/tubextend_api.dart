@@ -4,8 +4,10 @@ import 'package:googleapis/youtube/v3.dart';
 import 'package:http/http.dart';
 
 export './src/core/constants.dart';
+export './src/core/exceptions.dart';
 export './src/core/extensions.dart';
 export './src/core/models.dart';
+export './src/core/rate_limiter.dart';
 
 export './src/transcription.dart';
 export './src/summary.dart';
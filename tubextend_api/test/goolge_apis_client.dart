@@ -1,3 +1,6 @@
+import 'dart:convert';
+import 'dart:io';
+
 import 'package:googleapis_auth/auth_io.dart';
 import 'package:http/http.dart' as http;
 import 'package:tubextend_api/src/core/constants.dart';
@@ -5,22 +8,80 @@ import 'package:tubextend_api/src/core/logger.dart';
 
 import 'env.dart';
 
+/// Credentials from the last user consent, kept between test runs so the consent flow only runs when they cannot be
+/// reused or refreshed.
+final _credentialsFile = File('./temp/google_credentials.json');
+final _clientId = ClientId(Env.googleClientId, Env.googleClientSecret);
+
+/// Set in CI to authenticate with a stored refresh token, since the consent flow needs a browser.
+const _refreshTokenVariable = 'GOOGLE_REFRESH_TOKEN';
+
 Future<AuthClient> getAuthClient() async {
   final client = http.Client();
 
   try {
-    final credentials = await obtainAccessCredentialsViaUserConsent(
-      ClientId(
-        Env.googleClientId,
-        Env.googleClientSecret,
-      ),
-      kTubeXtendGoogleApisScopes,
-      client,
-      (String url) => logger.i('Please go to the following URL and grant access:\n$url'),
-    );
-    return authenticatedClient(client, credentials);
+    final refreshToken = Platform.environment[_refreshTokenVariable];
+    final credentials = refreshToken != null && refreshToken.isNotEmpty
+        ? await _credentialsFromRefreshToken(refreshToken, client)
+        : (await _loadCredentials(client) ?? await _obtainCredentials(client));
+    if (credentials.refreshToken == null) return authenticatedClient(client, credentials);
+    // The YouTube tests page through whole lists and can outlive the access token, so refresh it as needed.
+    final authClient = autoRefreshingClient(_clientId, credentials, client);
+    authClient.credentialUpdates.listen(_saveCredentials);
+    return authClient;
   } catch (e) {
     logger.e(e);
     rethrow;
   }
 }
+
+Future<AccessCredentials> _obtainCredentials(http.Client client) async {
+  final credentials = await obtainAccessCredentialsViaUserConsent(
+    _clientId,
+    kTubeXtendGoogleApisScopes,
+    client,
+    (String url) => logger.i('Please go to the following URL and grant access:\n$url'),
+  );
+  await _saveCredentials(credentials);
+  return credentials;
+}
+
+Future<AccessCredentials> _credentialsFromRefreshToken(String refreshToken, http.Client client) {
+  // Starts from an expired, empty access token, so the refresh fetches a valid one.
+  final credentials = AccessCredentials(
+    AccessToken('Bearer', '', DateTime.now().toUtc()),
+    refreshToken,
+    kTubeXtendGoogleApisScopes,
+  );
+  return refreshCredentials(_clientId, credentials, client);
+}
+
+/// Returns the cached credentials, refreshing their access token first if it has expired.
+///
+/// Returns `null` if there are no cached credentials, they lack one of the required scopes, or they cannot be
+/// refreshed.
+Future<AccessCredentials?> _loadCredentials(http.Client client) async {
+  if (!await _credentialsFile.exists()) return null;
+  try {
+    final credentials = AccessCredentials.fromJson(jsonDecode(await _credentialsFile.readAsString()));
+    // Credentials granted for an older set of scopes would fail with 403, so ask for consent again instead.
+    if (!kTubeXtendGoogleApisScopes.every(credentials.scopes.contains)) return null;
+    if (!credentials.accessToken.hasExpired) return credentials;
+    if (credentials.refreshToken == null) return null;
+    // A refresh is a single token request, instead of sending the user through the consent flow again.
+    final refreshed = await refreshCredentials(_clientId, credentials, client);
+    await _saveCredentials(refreshed);
+    return refreshed;
+  } catch (e) {
+    logger.w('Ignoring unusable cached Google credentials: $e');
+    return null;
+  }
+}
+
+Future<void> _saveCredentials(AccessCredentials credentials) async {
+  await _credentialsFile.parent.create(recursive: true);
+  // Written next to the cache and renamed over it, so an interrupted run never leaves a truncated file behind.
+  final tempFile = File('${_credentialsFile.path}.tmp');
+  await tempFile.writeAsString(jsonEncode(credentials.toJson()));
+  await tempFile.rename(_credentialsFile.path);
+}
@@ -1,8 +1,16 @@
+import 'dart:convert';
 import 'dart:io';
 
 import 'package:flutter_test/flutter_test.dart';
+import 'package:googleapis/youtube/v3.dart'
+    show DetailedApiRequestError, Playlist, ResourceId, Subscription, SubscriptionSnippet, Video, YouTubeApi;
 import 'package:googleapis_auth/auth_io.dart';
+import 'package:http/http.dart' as http;
+import 'package:http/testing.dart';
+import 'package:tubextend_api/src/core/cache.dart';
+import 'package:tubextend_api/src/core/concurrency.dart';
 import 'package:tubextend_api/src/core/logger.dart';
+import 'package:tubextend_api/src/core/retry.dart';
 
 import 'package:tubextend_api/tubextend_api.dart';
 
@@ -46,11 +54,291 @@ void main() {
       final nullFreeList = testList.uniquesNullFree;
       expect(nullFreeList.length, testLength - 2);
     });
+    test('split a list into chunks', () {
+      final chunks = List.generate(7, (i) => i).chunked(3);
+      expect(chunks.toList(), [
+        [0, 1, 2],
+        [3, 4, 5],
+        [6],
+      ]);
+    });
+    test('get videos unique by id', () {
+      final videos = [Video(id: 'a'), Video(id: 'b'), Video(id: 'a'), Video(id: 'c')];
+      expect(videos.uniqueById.map((v) => v.id), ['a', 'b', 'c']);
+    });
+  });
+
+  group('cache', () {
+    test('returns cached values until they expire', () async {
+      final cache = TtlCache<String, int>(ttl: const Duration(milliseconds: 20));
+      cache.set('a', 1);
+      expect(cache.get('a'), 1);
+      expect(cache.get('b'), null);
+      await Future.delayed(const Duration(milliseconds: 30));
+      expect(cache.get('a'), null);
+    });
+
+    test('evicts the least recently used value past max entries', () {
+      final cache = TtlCache<String, int>(ttl: const Duration(hours: 1), maxEntries: 2);
+      cache.set('a', 1);
+      cache.set('b', 2);
+      cache.get('a');
+      cache.set('c', 3);
+      expect(cache.get('a'), 1);
+      expect(cache.get('b'), null);
+      expect(cache.get('c'), 3);
+    });
+  });
+
+  group('concurrency', () {
+    test('map with a bounded number of calls in flight', () async {
+      var inFlight = 0;
+      var maxInFlight = 0;
+      final results = await mapConcurrently(
+        List.generate(10, (i) => i),
+        (int i) async {
+          inFlight++;
+          maxInFlight = inFlight > maxInFlight ? inFlight : maxInFlight;
+          await Future.delayed(const Duration(milliseconds: 10));
+          inFlight--;
+          return i * 2;
+        },
+        concurrency: 3,
+      );
+      expect(results, List.generate(10, (i) => i * 2));
+      expect(maxInFlight, 3);
+    });
+
+    test('stop starting new calls after one fails', () async {
+      final started = <int>[];
+      await expectLater(
+        mapConcurrently(
+          List.generate(10, (i) => i),
+          (int i) async {
+            started.add(i);
+            await Future.delayed(const Duration(milliseconds: 10));
+            if (i == 0) throw Exception('failed');
+            return i;
+          },
+          concurrency: 2,
+        ),
+        throwsException,
+      );
+      expect(started, [0, 1]);
+    });
+
+    test('rate limiter lets a burst through and then paces requests', () async {
+      final limiter = RateLimiter(capacity: 2, refillPerSecond: 20);
+      final stopwatch = Stopwatch()..start();
+      await limiter.acquire();
+      await limiter.acquire();
+      expect(stopwatch.elapsedMilliseconds < 40, true);
+      await limiter.acquire();
+      await limiter.acquire();
+      expect(stopwatch.elapsedMilliseconds >= 90, true);
+    });
+
+    test('rate limiter charges each request its cost', () async {
+      final limiter = RateLimiter(capacity: 4, refillPerSecond: 20);
+      final stopwatch = Stopwatch()..start();
+      await limiter.acquire(4);
+      expect(stopwatch.elapsedMilliseconds < 40, true);
+      await limiter.acquire(2);
+      expect(stopwatch.elapsedMilliseconds >= 90, true);
+    });
+  });
+
+  group('retry', () {
+    test('retries transient errors until the action succeeds', () async {
+      var attempts = 0;
+      final result = await withRetry(
+        () async {
+          if (++attempts < 3) throw const SocketException('connection reset');
+          return 'ok';
+        },
+        initialDelay: const Duration(milliseconds: 1),
+      );
+      expect(result, 'ok');
+      expect(attempts, 3);
+    });
+
+    test('does not retry other errors', () async {
+      var attempts = 0;
+      await expectLater(
+        withRetry(() async {
+          attempts++;
+          throw Exception('not transient');
+        }),
+        throwsException,
+      );
+      expect(attempts, 1);
+    });
+  });
+
+  group('YouTube with a fake client', () {
+    var requests = 0;
+    // Answers every request with a YouTube API error carrying the given status and reason.
+    AuthClient fakeClient(int status, String reason) {
+      requests = 0;
+      return fakeYouTubeClient((_) async {
+        requests++;
+        return jsonResponse({
+          'error': {
+            'code': status,
+            'message': reason,
+            'errors': [
+              {'reason': reason},
+            ],
+          },
+        }, status: status);
+      });
+    }
+
+    Future<DetailedApiRequestError> apiError(int status, String reason) async {
+      try {
+        await YouTubeApi(fakeClient(status, reason)).playlistItems.list(['snippet'], playlistId: 'playlist');
+      } on DetailedApiRequestError catch (e) {
+        return e;
+      }
+      throw StateError('Expected a DetailedApiRequestError');
+    }
+
+    test('treats server errors and rate limits as transient but not an exhausted quota', () async {
+      expect(isTransientError(await apiError(503, 'backendError')), true);
+      expect(isTransientError(await apiError(403, 'rateLimitExceeded')), true);
+      expect(isTransientError(await apiError(403, 'quotaExceeded')), false);
+    });
+
+    test('reports an exhausted quota as QuotaExceededException without retrying', () async {
+      final client = fakeClient(403, 'quotaExceeded');
+      await expectLater(getnVideosFromPlaylist(client, 'playlist'), throwsA(isA<QuotaExceededException>()));
+      expect(requests, 1);
+    });
+
+    test('stops a multi-playlist batch once the quota is exhausted', () async {
+      final client = fakeClient(403, 'quotaExceeded');
+      await expectLater(
+        getnVideosFromPlaylists(client, List.generate(10, (i) => 'playlist$i'), concurrency: 2),
+        throwsA(isA<QuotaExceededException>()),
+      );
+      expect(requests, 2);
+    });
+
+    // Each category test uses its own region, since the category cache is shared by the whole test run.
+    final categoriesResponse = {
+      'items': [
+        {
+          'id': '1',
+          'snippet': {'title': 'Film & Animation', 'channelId': 'channel'},
+        },
+      ],
+    };
+
+    test('shares one in-flight category request between concurrent callers', () async {
+      var requests = 0;
+      final client = fakeYouTubeClient((_) async {
+        requests++;
+        return jsonResponse(categoriesResponse);
+      });
+      final results = await Future.wait([
+        getYTCategories(client, regionCode: 'AA'),
+        getYTCategories(client, regionCode: 'AA'),
+      ]);
+      expect(requests, 1);
+      expect(results.first.single.id, '1');
+      expect(identical(results.first, results.last), true);
+    });
+
+    test('does not cache a failed category request', () async {
+      var requests = 0;
+      final client = fakeYouTubeClient((_) async {
+        requests++;
+        return jsonResponse(requests == 1 ? {'items': []} : categoriesResponse);
+      });
+      await expectLater(getYTCategories(client, regionCode: 'AB'), throwsException);
+      final categories = await getYTCategories(client, regionCode: 'AB');
+      expect(categories.single.id, '1');
+      expect(requests, 2);
+    });
+
+    test('look up uploads playlists in batches of at most 50 channels', () async {
+      final requestedIds = <List<String>>[];
+      final client = fakeYouTubeClient((request) async {
+        final ids = request.url.queryParametersAll['id']!.expand((id) => id.split(',')).toList();
+        requestedIds.add(ids);
+        return jsonResponse({
+          'items': [
+            for (final id in ids)
+              {
+                'id': id,
+                'contentDetails': {
+                  'relatedPlaylists': id == 'channel7' ? <String, dynamic>{} : {'uploads': 'uploads-$id'},
+                },
+              },
+          ],
+        });
+      });
+      final subscriptions = List.generate(
+        60,
+        (i) => Subscription(snippet: SubscriptionSnippet(resourceId: ResourceId(channelId: 'channel$i'))),
+      );
+      final uploadsPlaylistIds = await getUploadsPlaylistIdsFromSubscriptions(client, subscriptions);
+      expect(requestedIds.map((ids) => ids.length), unorderedEquals([50, 10]));
+      expect(requestedIds.expand((ids) => ids).toSet(), List.generate(60, (i) => 'channel$i').toSet());
+      expect(uploadsPlaylistIds.length, 59);
+      expect(uploadsPlaylistIds.containsKey('channel7'), false);
+      expect(uploadsPlaylistIds['channel0'], 'uploads-channel0');
+    });
+
+    test('drops playlist items published before the cutoff, wherever they are', () async {
+      // Listed in playlist position order, not newest first.
+      final client = fakeYouTubeClient((_) async => jsonResponse({
+            'items': [
+              playlistItemJson('a', DateTime.utc(2024, 1, 10)),
+              playlistItemJson('b', DateTime.utc(2024, 1, 1)),
+              playlistItemJson('c', DateTime.utc(2024, 1, 20)),
+            ],
+          }));
+      final videos = await getnVideosFromPlaylist(client, 'playlist', publishedAfter: DateTime.utc(2024, 1, 5));
+      expect(videos.map((v) => v.id), ['a', 'c']);
+    });
+
+    test('reports a failed prefetch to a listener that is slow to ask for the next page', () async {
+      final client = fakeYouTubeClient((request) async => request.url.queryParameters['pageToken'] == null
+          ? jsonResponse({
+              'items': [playlistItemJson('a', DateTime.utc(2024))],
+              'nextPageToken': 'page2',
+            })
+          : jsonResponse({
+              'error': {
+                'code': 400,
+                'message': 'invalid page token',
+                'errors': [
+                  {'reason': 'invalidPageToken'},
+                ],
+              },
+            }, status: 400));
+      final pages = <List<Video>>[];
+      Future<void> consume() async {
+        await for (final page in streamVideosOfPlaylist(client, 'playlist')) {
+          pages.add(page);
+          // Keeps the generator paused at yield while the prefetched page fails.
+          await Future.delayed(const Duration(milliseconds: 50));
+        }
+      }
+
+      await expectLater(consume(), throwsA(isA<DetailedApiRequestError>()));
+      expect(pages.single.single.id, 'a');
+    });
   });
 
   group('ElevenLabs TTS', () {
+    late final http.Client httpClient;
+    setUpAll(() => httpClient = http.Client());
+    tearDownAll(() => httpClient.close());
+
     test('gets a list of voices', () async {
-      final voices = await listVoices(Env.elevenLabsKey);
+      final voices = await listVoices(Env.elevenLabsKey, client: httpClient);
       expect(voices.isNotEmpty, true);
     });
 
@@ -61,6 +349,7 @@ void main() {
         fileName: 'eleven_labs_audio_test',
         tempDirectory: Directory('./temp'),
         voiceId: elevenLabsDaveVoiceId,
+        client: httpClient,
       );
       expect(audio.existsSync(), true);
     });
@@ -68,7 +357,18 @@ void main() {
 
   group('Youtube Functions', () {
     late final AuthClient client;
-    setUpAll(() async => client = await getAuthClient());
+    var hasClient = false;
+    setUpAll(() async {
+      client = await getAuthClient();
+      hasClient = true;
+    });
+    // Reading client after a failed setUpAll would throw and hide the real error.
+    tearDownAll(() {
+      if (hasClient) client.close();
+    });
+    // Fetched on first use and shared by every test that needs them, instead of once per test.
+    late final Future<List<Subscription>> subscriptions = getUserSubscriptions(client);
+    late final Future<List<Playlist>> playlists = getUserPlaylists(client);
 
     test('get a list of categories as channel ids', () async {
       final categories = await getYTCategoriesAsChannelIds(client);
@@ -90,30 +390,54 @@ void main() {
     });
 
     test('get user playlists', () async {
-      final playlists = await getUserPlaylists(client);
-      logger.i('retreived a total of ${playlists.length} playlists');
-      expect(playlists.isNotEmpty, true);
+      final userPlaylists = await playlists;
+      logger.i('retreived a total of ${userPlaylists.length} playlists');
+      expect(userPlaylists.isNotEmpty, true);
     });
 
     test('get user subscriptions', () async {
-      final subscriptions = await getUserSubscriptions(client);
-      logger.i('retreived a total of ${subscriptions.length} subscriptions');
-      expect(subscriptions.isNotEmpty, true);
+      final userSubscriptions = await subscriptions;
+      logger.i('retreived a total of ${userSubscriptions.length} subscriptions');
+      expect(userSubscriptions.isNotEmpty, true);
     });
 
     test('get upload playlist id from subscription', () async {
-      final subscriptions = await getUserSubscriptions(client);
-      final uploadsPlaylistId = await getUploadsPlaylistIdFromSubscription(client, subscriptions.first);
+      final userSubscriptions = await subscriptions;
+      final uploadsPlaylistId = await getUploadsPlaylistIdFromSubscription(client, userSubscriptions.first);
       logger.i('retreived uploads playlist id: $uploadsPlaylistId');
       expect(uploadsPlaylistId.isNotEmpty, true);
     });
 
+    test('get upload playlist ids from all subscriptions', () async {
+      final userSubscriptions = await subscriptions;
+      final uploadsPlaylistIds = await getUploadsPlaylistIdsFromSubscriptions(client, userSubscriptions);
+      logger.i('retreived ${uploadsPlaylistIds.length} uploads playlist ids '
+          'from ${userSubscriptions.length} subscriptions');
+      expect(uploadsPlaylistIds.isNotEmpty, true);
+    });
+
     test('get all videos from a playlist', () async {
       final videos = await getAllVideosOfPlaylists(client, testPlaylistId);
       logger.i('retreived a total of ${videos.length} videos from $testPlaylistId playlist');
       expect(videos.isNotEmpty, true);
     });
 
+    test('get only recent videos from a playlist', () async {
+      final cutoff = DateTime.now().subtract(const Duration(days: 30));
+      final videos = await getAllVideosOfPlaylists(client, testPlaylistId);
+      final recentVideos = await getAllVideosOfPlaylists(client, testPlaylistId, publishedAfter: cutoff);
+      logger.i('retreived ${recentVideos.length} of ${videos.length} videos from $testPlaylistId playlist');
+      expect(recentVideos.every((v) => v.snippet?.publishedAt?.isAfter(cutoff) == true), true);
+      final newestFirstPrefix = videos.takeWhile((v) => v.snippet?.publishedAt?.isAfter(cutoff) == true);
+      expect(recentVideos.map((v) => v.id), newestFirstPrefix.map((v) => v.id));
+    });
+
+    test('stream all videos from a playlist page by page', () async {
+      final pages = await streamVideosOfPlaylist(client, testPlaylistId).toList();
+      logger.i('retreived ${pages.length} pages of videos from $testPlaylistId playlist');
+      expect(pages.expand((page) => page).isNotEmpty, true);
+    });
+
     test('get up to X videos from a playlist', () async {
       final videos = await getnVideosFromPlaylist(
         client,
@@ -125,6 +449,14 @@ void main() {
       expect(videos.length, 5);
     });
 
+    test('get up to X videos from several playlists', () async {
+      final userPlaylists = await playlists;
+      final playlistIds = [testPlaylistId, ...userPlaylists.take(2).map((p) => p.id!)];
+      final videosByPlaylist = await getnVideosFromPlaylists(client, playlistIds, maxResults: 5);
+      logger.i('retreived videos from ${videosByPlaylist.length} of ${playlistIds.length} playlists');
+      expect(videosByPlaylist[testPlaylistId]?.length, 5);
+    });
+
     test('get videos from playlist as paginated response', () async {
       final response1 = await getPaginatedVideosFromPlaylist(
         client,
@@ -145,3 +477,24 @@ void main() {
     });
   });
 }
+
+/// An [AuthClient] that answers every request with [handler] instead of calling Google.
+AuthClient fakeYouTubeClient(MockClientHandler handler) => authenticatedClient(
+      MockClient(handler),
+      AccessCredentials(
+        AccessToken('Bearer', 'token', DateTime.now().toUtc().add(const Duration(hours: 1))),
+        null,
+        [],
+      ),
+    );
+
+http.Response jsonResponse(Map<String, dynamic> json, {int status = 200}) =>
+    http.Response(jsonEncode(json), status, headers: {'content-type': 'application/json; charset=UTF-8'});
+
+Map<String, dynamic> playlistItemJson(String videoId, DateTime publishedAt) => {
+      'snippet': {
+        'title': videoId,
+        'publishedAt': publishedAt.toIso8601String(),
+        'resourceId': {'kind': 'youtube#video', 'videoId': videoId},
+      },
+    };